@@ -1,11 +1,30 @@
 import os
-import json
+import re
+import html
+import secrets
+import sys
+import orjson
+import atexit
 import asyncio
-import threading
-from datetime import datetime, timedelta
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Final
+from aiolimiter import AsyncLimiter
 from aiogram import Bot, Dispatcher, types
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramRetryAfter
 from aiogram.filters import Command
-from keep_alive import keep_alive, init_webhook
+from keep_alive import start_http
+
+# Prefer the libuv-backed event loop when it is installed
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
 
 
 # ----------------- Config -----------------
@@ -13,229 +32,543 @@ BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 if not BOT_TOKEN:
     raise ValueError("TELEGRAM_BOT_TOKEN environment variable not set")
 
+# Public base URL Telegram can reach; Render sets both variables for web services
+_HOSTNAME = os.environ.get("RENDER_EXTERNAL_HOSTNAME")
+PUBLIC_URL = (os.environ.get("RENDER_EXTERNAL_URL") or (f"https://{_HOSTNAME}" if _HOSTNAME else "")).rstrip("/")
+
+# "webhook" has Telegram push updates to WEBHOOK_URL; "polling" uses getUpdates.
+# Webhook is the default only when a public URL is known.
+MODE = os.environ.get("MODE", "webhook" if PUBLIC_URL else "polling").strip().lower()
+if MODE not in ("polling", "webhook"):
+    raise ValueError(f"MODE must be 'polling' or 'webhook', got {MODE!r}")
+if MODE == "webhook" and not PUBLIC_URL:
+    raise ValueError("MODE=webhook requires RENDER_EXTERNAL_URL or RENDER_EXTERNAL_HOSTNAME")
+
 PORT = int(os.environ.get("PORT", 8080))
-HOSTNAME = os.environ.get("RENDER_EXTERNAL_HOSTNAME", "gswarm-multibot.onrender.com")
-WEBHOOK_PATH = f"/webhook/{BOT_TOKEN}"
-WEBHOOK_URL = f"https://{HOSTNAME}{WEBHOOK_PATH}"
+_DEBUG = os.getenv("BOT_DEBUG") == "1"  # per-message handler diagnostics
+# Random per process: the bot token never appears in a URL, and updates
+# without Telegram's X-Telegram-Bot-Api-Secret-Token header are rejected
+WEBHOOK_PATH = f"/webhook/{secrets.token_urlsafe(24)}"
+WEBHOOK_SECRET = secrets.token_urlsafe(32)
+WEBHOOK_URL = f"{PUBLIC_URL}{WEBHOOK_PATH}"
 
 USER_CONFIG_PATH = "/app/telegram-config.json"
 GSWARM_CMD = "gswarm"
-SESSION_TIMEOUT = timedelta(minutes=10)
-
-# This will hold the asyncio loop reference (set in main())
-asyncio_loop = None
-
-bot = Bot(token=BOT_TOKEN)
+SESSION_TIMEOUT = 600.0  # seconds of inactivity, measured on loop.time()
+MAX_QUEUE = 256
+QUEUE_MAX_AGE = 1800.0  # seconds a user may wait in the queue
+# StreamReader buffer for gswarm's stdout and stderr; lets bursts accumulate before the pipe is paused
+_PIPE_LIMIT = 256 * 1024
+# Seconds gswarm gets to exit after SIGTERM before it is killed
+_KILL_GRACE = 1.5
+# Forwarded gswarm lines are coalesced for this long before being sent. A
+# digest (and any single line, truncated if needed) stays well below
+# Telegram's 4096-character message limit.
+_FORWARD_DEBOUNCE = 0.25
+_FORWARD_MAX_CHARS = 3500
+
+# Static replies, defined once
+_WELCOME: Final[str] = "👋 Welcome! Send your EVM address (0x...) to start monitoring."
+_HELP: Final[str] = "⚠️ Send a valid EVM address (starting with 0x) to start."
+_SESSION_STARTED: Final[str] = "✅ GSwarm monitoring started! Updates will appear here."
+_YOUR_TURN: Final[str] = "🚀 Your turn! Starting your GSwarm monitoring session now..."
+_GSWARM_NOT_FOUND: Final[str] = "❌ GSwarm binary not found in PATH. Ensure gswarm is installed in the container."
+_NO_PEERID: Final[str] = "⚠️ No peer IDs found. Please use a valid EVM address."
+_LINKED: Final[str] = "🎉 Account linked successfully! Ending session..."
+_REMOVED_FROM_QUEUE: Final[str] = "🟡 Removed from queue."
+_NOTHING_TO_STOP: Final[str] = "ℹ️ No active or queued session."
+_VERIFY_SENT: Final[str] = "✅ Verification command sent to GSwarm. Waiting for response..."
+_STDIN_CLOSED: Final[str] = "⚠️ GSwarm process stdin is closed. The process may have exited."
+_NO_PROCESS: Final[str] = "ℹ️ No active session or GSwarm process unavailable."
+_ALREADY_ACTIVE: Final[str] = "ℹ️ Your GSwarm session is already running. Send /stop to end it."
+_QUEUE_FULL: Final[str] = "🚫 The queue is full right now. Please try again later."
+_QUEUE_EXPIRED: Final[str] = f"⌛ You waited in the queue for over {QUEUE_MAX_AGE / 60:g} minutes and were removed. Send your EVM address to queue again."
+_SESSION_TIMED_OUT: Final[str] = f"⏰ Session timed out after {SESSION_TIMEOUT / 60:g} minutes of inactivity."
+
+# Process-constant part of the gswarm environment, built once at import
+_BASE_ENV = {
+    **os.environ,
+    "GSWARM_TELEGRAM_CONFIG_PATH": USER_CONFIG_PATH,
+    "GSWARM_UPDATE_TELEGRAM_CONFIG": "false",
+    "GSWARM_TELEGRAM_BOT_TOKEN": BOT_TOKEN,
+}
+
+_EVM_RE = re.compile(r"0x[0-9a-fA-F]{40}")
+# Cheap bytes-level pre-filter: lines that miss it skip the detailed regexes
+_INTEREST_RE = re.compile(rb"verif|code|linked|success|error|failed|invalid|no peer ids|you can now use both", re.IGNORECASE)
+# Every gswarm line pattern fused into one alternation; finditer() reports each
+# hit by group name. Specific phrases come first so they win over the generic
+# keywords they contain. Matched against the raw bytes, so lines are decoded
+# only when they are forwarded.
+_LINE_RE = re.compile(
+    rb"(?P<verify>verify\s+code[:\s]+(?P<code>[A-Za-z0-9\-]+))"
+    rb"|(?P<nopeer>no peer ids found for address)"
+    rb"|(?P<linked>account successfully linked|accounts linked successfully|you can now use both discord and telegram)"
+    rb"|(?P<err>error|failed|invalid)"
+    rb"|(?P<resp>verify|verification|code|linked|success)",
+    re.IGNORECASE,
+)
+
+# Supervisor/gswarm log lines are only enqueued on the event loop; a listener
+# thread does the message formatting and the actual stream writes
+class _DeferredQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # In-process queue: hand the record over unformatted
+        return record
+
+class _Utf8Line:
+    """Raw gswarm output that is decoded only when the log record is formatted."""
+    __slots__ = ("raw",)
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+
+    def __str__(self):
+        return self.raw.decode("utf-8", errors="ignore")
+
+_log_queue = SimpleQueue()
+_log_listener = QueueListener(_log_queue, logging.StreamHandler(sys.stderr))
+log = logging.getLogger("supervisor")
+log.addHandler(_DeferredQueueHandler(_log_queue))
+log.setLevel(logging.DEBUG if _DEBUG else logging.INFO)
+log.propagate = False
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+class PooledAiohttpSession(AiohttpSession):
+    """AiohttpSession that keeps TLS connections to api.telegram.org alive between bursts of sends."""
+
+    def __init__(self, *, limit: int = 100, keepalive_timeout: float = 75, **kwargs):
+        super().__init__(**kwargs)
+        # aiogram 3.4 has no constructor argument for the connector; these are
+        # the kwargs its create_session() passes to TCPConnector
+        self._connector_init.update(limit=limit, ttl_dns_cache=300, keepalive_timeout=keepalive_timeout)
+
+# json_loads also parses incoming webhook updates and API responses
+session = PooledAiohttpSession(json_loads=orjson.loads)
+bot = Bot(token=BOT_TOKEN, session=session)
 dp = Dispatcher()
 
-active_session = {"chat_id": None, "proc": None, "last_active": None}
-session_queue = []
+# Stay under Telegram's ~30 msg/s bot-wide and ~1 msg/s per-chat limits. The
+# per-chat bucket lets a short burst through (e.g. "your turn" + "started").
+_tg_limiter = AsyncLimiter(25, 1)
+_CHAT_LIMITERS_MAX = 1024
+_chat_limiters: OrderedDict[int, AsyncLimiter] = OrderedDict()  # LRU, bounded
+
+@dataclass(slots=True)
+class Session:
+    chat_id: int | None = None
+    proc: asyncio.subprocess.Process | None = None
+    last_active: float | None = None  # loop.time() of last activity
+    timeout_handle: asyncio.TimerHandle | None = None
+    reader_tasks: tuple[asyncio.Task, ...] = ()  # monitor_gswarm_output for proc's stdout and stderr
+
+active_session = Session()
+session_queue: OrderedDict[int, tuple[str, float]] = OrderedDict()  # chat_id -> (evm_address, enqueued_at)
+_bg_tasks = set()  # strong refs to fire-and-forget tasks
+_queue_timer: asyncio.TimerHandle | None = None  # fires when the queue head expires
+_session_lock = asyncio.Lock()  # guards active_session admission, reset and queue hand-off
 
 # ----------------- Helpers -----------------
+def chat_limiter(chat_id: int) -> AsyncLimiter:
+    """Per-chat limiter, kept only for the most recently messaged chats."""
+    limiter = _chat_limiters.get(chat_id)
+    if limiter is None:
+        limiter = _chat_limiters[chat_id] = AsyncLimiter(3, 3)
+        if len(_chat_limiters) > _CHAT_LIMITERS_MAX:
+            _chat_limiters.popitem(last=False)
+    else:
+        _chat_limiters.move_to_end(chat_id)
+    return limiter
+
+async def _send_limited(chat_id: int, text: str, **kwargs):
+    async with chat_limiter(chat_id), _tg_limiter:
+        await bot.send_message(chat_id, text, **kwargs)
+
 async def send_safe(chat_id: int, text: str, **kwargs):
     try:
-        await bot.send_message(chat_id, text, **kwargs)
+        try:
+            await _send_limited(chat_id, text, **kwargs)
+        except TelegramRetryAfter as e:
+            # Flood control: wait as long as Telegram asks, then retry once
+            log.warning("[supervisor] rate limited, retrying in %ss", e.retry_after)
+            await asyncio.sleep(e.retry_after)
+            await _send_limited(chat_id, text, **kwargs)
     except Exception as e:
-        print(f"[supervisor] failed to send message to {chat_id}: {e}")
+        log.warning("[supervisor] failed to send message to %s: %s", chat_id, e)
+
+def join_notices(*parts: str | None) -> str:
+    """Merge several notices into one message body, skipping empty parts."""
+    return "\n\n".join(p for p in parts if p)
+
+async def send_safe_multi(chat_id: int, *parts: str | None, **kwargs):
+    """Send several notices to one chat as a single message."""
+    text = join_notices(*parts)
+    if text:
+        await send_safe(chat_id, text, **kwargs)
+
+def spawn(coro) -> asyncio.Task:
+    """create_task that holds a strong ref until the task is done, so it is never GC'd mid-flight."""
+    task = asyncio.create_task(coro)
+    _bg_tasks.add(task)
+    task.add_done_callback(_bg_tasks.discard)
+    return task
+
+def send_bg(chat_id: int, text: str, **kwargs):
+    """Fire-and-forget send_safe for notifications nothing else waits on."""
+    spawn(send_safe(chat_id, text, **kwargs))
+
+def write_user_config(cfg: dict):
+    # Atomic rename instead of fsync: gswarm only needs to see a complete file
+    os.makedirs(os.path.dirname(USER_CONFIG_PATH), exist_ok=True)
+    tmp_path = USER_CONFIG_PATH + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(cfg))
+    os.replace(tmp_path, USER_CONFIG_PATH)
 
-async def stop_active_session(reason: str = "Session ended."):
-    global active_session
-    proc = active_session.get("proc")
+def session_ended_text(reason: str) -> str:
+    return f"⚠️ {reason}\n\nIf you still want to monitor, please restart with /start."
 
-    if proc:
+async def shutdown_gswarm(proc):
+    """Terminate gswarm, killing it if it has not exited within _KILL_GRACE."""
+    try:
+        proc.terminate()
         try:
-            proc.terminate()
-            try:
-                await asyncio.wait_for(proc.wait(), timeout=5)
-            except asyncio.TimeoutError:
-                proc.kill()
-                await proc.wait()
-        except Exception as e:
-            print("[supervisor] error stopping process:", e)
-
-    chat_id = active_session.get("chat_id")
-    if chat_id:
-        await send_safe(chat_id, f"⚠️ {reason}\n\nIf you still want to monitor, please restart with /start.")
-
-    active_session.update({"chat_id": None, "proc": None, "last_active": None})
-
+            await asyncio.wait_for(proc.wait(), timeout=_KILL_GRACE)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+    except Exception as e:
+        log.warning("[supervisor] error stopping process: %s", e)
+
+async def stop_active_session(reason: str = "Session ended.", silent: bool = False, only_proc=None):
+    # silent=True: the caller has already told the user, merged into its own message.
+    # only_proc: stop only if that gswarm process still owns the slot, so a late
+    # timer or reader never ends the session that replaced its own.
+    async with _session_lock:
+        chat_id = active_session.chat_id
+        if chat_id is None:
+            return  # already stopped via another path (timeout, /stop, process exit)
+        if only_proc is not None and active_session.proc is not only_proc:
+            return
+
+        if active_session.timeout_handle:
+            active_session.timeout_handle.cancel()
+
+        proc = active_session.proc
+        reader_tasks = active_session.reader_tasks
+        active_session.chat_id = None
+        active_session.proc = None
+        active_session.last_active = None
+        active_session.timeout_handle = None
+        active_session.reader_tasks = ()
+
+        # The notice goes out in the background while gswarm is reaped, so the
+        # lock is never held across Telegram rate limiting
+        if not silent:
+            send_bg(chat_id, session_ended_text(reason))
+        if proc:
+            await shutdown_gswarm(proc)
+
+        # The readers normally end on EOF once proc is gone; cancel them in case
+        # one is stuck. Skipped for the reader that is itself stopping the session.
+        others = [t for t in reader_tasks if t is not asyncio.current_task()]
+        for t in others:
+            t.cancel()
+        await asyncio.gather(*others, return_exceptions=True)
+
+        # Hand the slot to the next queued user before the lock is released, so
+        # a newcomer can never take it in between. A user whose gswarm fails to
+        # start is skipped and the following one gets the slot.
+        while session_queue:
+            next_chat_id, (next_evm, _) = session_queue.popitem(last=False)
+            send_bg(next_chat_id, _YOUR_TURN)
+            if await launch_session(next_chat_id, next_evm):
+                send_bg(next_chat_id, _SESSION_STARTED)
+                break
+        evict_stale_queue()  # re-arms the expiry timer for the new head
+
+def touch_active_session():
+    """Record activity and re-arm the single inactivity timer for the active session."""
+    loop = asyncio.get_running_loop()
+    active_session.last_active = loop.time()
+    if active_session.timeout_handle:
+        active_session.timeout_handle.cancel()
+    proc = active_session.proc
+    active_session.timeout_handle = loop.call_later(
+        SESSION_TIMEOUT,
+        lambda: spawn(stop_active_session(_SESSION_TIMED_OUT, only_proc=proc)),
+    )
+
+def evict_stale_queue():
+    """Drop queue entries older than QUEUE_MAX_AGE and re-arm the timer for the new head."""
+    global _queue_timer
+    loop = asyncio.get_running_loop()
+    cutoff = loop.time() - QUEUE_MAX_AGE
+    while session_queue:
+        stale_chat_id, (_, enqueued_at) = next(iter(session_queue.items()))
+        if enqueued_at >= cutoff:
+            break
+        del session_queue[stale_chat_id]
+        send_bg(stale_chat_id, _QUEUE_EXPIRED)
+
+    if _queue_timer:
+        _queue_timer.cancel()
+        _queue_timer = None
     if session_queue:
-        next_chat_id, next_evm = session_queue.pop(0)
-        await send_safe(next_chat_id, "🚀 Your turn! Starting your GSwarm monitoring session now...")
-        asyncio.create_task(start_session(next_chat_id, next_evm))
-
-async def session_timeout_checker():
-    while True:
-        await asyncio.sleep(30)
-        chat_id = active_session.get("chat_id")
-        last = active_session.get("last_active")
-        if chat_id and last and datetime.utcnow() - last > SESSION_TIMEOUT:
-            await stop_active_session("⏰ Session timed out after 10 minutes of inactivity.")
+        _, (_, head_enqueued_at) = next(iter(session_queue.items()))
+        # A second of slack so the timer never fires just before the head is stale
+        _queue_timer = loop.call_at(head_enqueued_at + QUEUE_MAX_AGE + 1, evict_stale_queue)
 
 # ----------------- GSwarm logic -----------------
-async def start_session(chat_id: int, evm_address: str):
-    global active_session, session_queue
-
-    if active_session["chat_id"]:
-        position = len(session_queue) + 1
-        session_queue.append((chat_id, evm_address))
-        await send_safe(chat_id, f"⏳ Another session is active.\nYou're added to the queue at position #{position}.")
-        return
-
+async def launch_session(chat_id: int, evm_address: str) -> bool:
+    """Start gswarm for chat_id in the free slot. Caller must hold _session_lock."""
     cfg = {"botToken": BOT_TOKEN, "chatID": chat_id, "eoaAddress": evm_address}
-    os.makedirs(os.path.dirname(USER_CONFIG_PATH), exist_ok=True)
-    with open(USER_CONFIG_PATH, "w") as f:
-        json.dump(cfg, f, indent=2)
-
-    env = os.environ.copy()
-    env["GSWARM_TELEGRAM_CONFIG_PATH"] = USER_CONFIG_PATH
-    env["GSWARM_EOA_ADDRESS"] = evm_address
-    env["GSWARM_TELEGRAM_BOT_TOKEN"] = BOT_TOKEN
-    env["GSWARM_TELEGRAM_CHAT_ID"] = str(chat_id)
+    env = {**_BASE_ENV, "GSWARM_EOA_ADDRESS": evm_address, "GSWARM_TELEGRAM_CHAT_ID": str(chat_id)}
 
     try:
+        await asyncio.to_thread(write_user_config, cfg)
         proc = await asyncio.create_subprocess_exec(
             GSWARM_CMD,
             f"--telegram-config-path={USER_CONFIG_PATH}",
             stdin=asyncio.subprocess.PIPE,
             stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.STDOUT,
+            stderr=asyncio.subprocess.PIPE,
             env=env,
+            cwd=os.path.dirname(USER_CONFIG_PATH) or "/app",
+            limit=_PIPE_LIMIT,
         )
-
-        active_session.update({"chat_id": chat_id, "proc": proc, "last_active": datetime.utcnow()})
-        await send_safe(chat_id, "✅ GSwarm monitoring started! Updates will appear here.")
-        asyncio.create_task(monitor_gswarm_output(proc, chat_id))
+    except FileNotFoundError:
+        send_bg(chat_id, _GSWARM_NOT_FOUND)
+        return False
     except Exception as e:
-        await send_safe(chat_id, f"❌ Failed to start GSwarm: {e}")
+        send_bg(chat_id, f"❌ Failed to start GSwarm: {e}")
+        return False
+
+    active_session.chat_id = chat_id
+    active_session.proc = proc
+    touch_active_session()
+    active_session.reader_tasks = (
+        spawn(monitor_gswarm_output(proc, chat_id, proc.stdout)),
+        spawn(monitor_gswarm_output(proc, chat_id, proc.stderr, forward_generic=False)),
+    )
+    return True
 
-async def monitor_gswarm_output(proc, chat_id):
-    import re
-    verify_re = re.compile(r"verify\s+code[:\s]+([A-Za-z0-9\-]+)", re.IGNORECASE)
-    success_indicators = ["account successfully linked", "accounts linked successfully"]
-    no_peerid_pattern = re.compile(r"no peer ids found for address", re.IGNORECASE)
-    error_patterns = [re.compile(r"error", re.IGNORECASE), re.compile(r"failed", re.IGNORECASE), re.compile(r"invalid", re.IGNORECASE)]
-    verify_response_pattern = re.compile(r"verify|verification|code|linked|success", re.IGNORECASE)
+async def start_session(chat_id: int, evm_address: str):
+    # Admission and spawn happen under the lock so two concurrent updates
+    # can never both see a free slot and start gswarm twice
+    async with _session_lock:
+        if active_session.chat_id:
+            if active_session.chat_id == chat_id:
+                send_bg(chat_id, _ALREADY_ACTIVE)
+                return
+            evict_stale_queue()
+            if chat_id in session_queue:
+                position = list(session_queue).index(chat_id) + 1
+                send_bg(chat_id, f"⏳ You're already queued at position #{position}.")
+                return
+            if len(session_queue) >= MAX_QUEUE:
+                send_bg(chat_id, _QUEUE_FULL)
+                return
+            position = len(session_queue) + 1
+            session_queue[chat_id] = (evm_address, asyncio.get_running_loop().time())
+            if len(session_queue) == 1:
+                evict_stale_queue()  # arms the expiry timer for the new head
+            send_bg(chat_id, f"⏳ Another session is active.\nYou're added to the queue at position #{position}.")
+            return
+
+        if not await launch_session(chat_id, evm_address):
+            return
+
+    await send_safe(chat_id, _SESSION_STARTED)
+
+async def read_lines(stream, chunk_size: int = 65536):
+    """Yield newline-delimited lines from a stream, reading it in large chunks."""
+    buf = bytearray()
+    while chunk := await stream.read(chunk_size):
+        buf.extend(chunk)
+        while (nl := buf.find(b"\n")) != -1:
+            line = bytes(buf[:nl])
+            del buf[:nl + 1]
+            yield line
+    if buf:
+        yield bytes(buf)
+
+async def monitor_gswarm_output(proc, chat_id, stream, forward_generic: bool = True):
+    # Runs once per gswarm stream. stderr (forward_generic=False) still gets the
+    # verify/no-peer/linked handling, since Go's log package writes there, but
+    # its generic error/success lines are only logged, not forwarded.
+    loop = asyncio.get_running_loop()
+    pending = []  # lines waiting to be forwarded as one digest
+    pending_chars = 0
+    flush_handle = None
+
+    def take_digest():
+        nonlocal flush_handle, pending_chars
+        if flush_handle:
+            flush_handle.cancel()
+            flush_handle = None
+        if not pending:
+            return None
+        text = f"📨 GSwarm: {pending[0]}" if len(pending) == 1 else "📨 GSwarm:\n" + "\n".join(pending)
+        pending.clear()
+        pending_chars = 0
+        return text
+
+    def flush_bg():
+        if text := take_digest():
+            send_bg(chat_id, text)
+
+    # Loop-invariant lookups bound once for the per-line path
+    log_info = log.info
+    tag = "[gswarm] %s" if forward_generic else "[gswarm:stderr] %s"
+    interesting = _INTEREST_RE.search
+    scan = _LINE_RE.finditer
 
     try:
-        while True:
-            line = await proc.stdout.readline()
-            if not line:
-                break
-            line = line.decode("utf-8", errors="ignore").strip()
-            print(f"[gswarm] {line}", flush=True)
-            
+        async for raw in read_lines(stream):
+            raw = raw.strip()
+            log_info(tag, _Utf8Line(raw))
+            if not interesting(raw):
+                continue
+
+            hits = {}
+            for m in scan(raw):
+                hits.setdefault(m.lastgroup, m)
+
             # Forward important responses to user (especially verification-related)
             # Also forward errors and success messages
-            if verify_response_pattern.search(line) or any(pattern.search(line) for pattern in error_patterns):
-                await send_safe(chat_id, f"📨 GSwarm: {line}")
-
-            if verify_re.search(line):
-                code = verify_re.search(line).group(1)
-                try:
-                    if proc.stdin and proc.returncode is None:
-                        verify_command = f"/verify {code}\n"
-                        proc.stdin.write(verify_command.encode('utf-8'))
+            if forward_generic and hits.keys() - {"nopeer"}:
+                line = raw.decode("utf-8", errors="ignore")
+                if len(line) > _FORWARD_MAX_CHARS:
+                    line = line[:_FORWARD_MAX_CHARS - 1] + "…"
+                if pending_chars + len(line) > _FORWARD_MAX_CHARS:
+                    flush_bg()
+                pending.append(line)
+                pending_chars += len(line) + 1
+                if not flush_handle:
+                    flush_handle = loop.call_later(_FORWARD_DEBOUNCE, flush_bg)
+
+            # Lines that trigger follow-up messages take the pending digest
+            # along, so the user gets one message in the right order
+            digest = take_digest() if hits.keys() & {"verify", "nopeer", "linked"} else None
+
+            m = hits.get("verify")
+            if m:
+                code_raw = m.group("code")
+                code = code_raw.decode("ascii")
+                if proc.stdin and not proc.stdin.is_closing() and proc.returncode is None:
+                    try:
+                        proc.stdin.write(b"/verify " + code_raw + b"\n")
                         await proc.stdin.drain()
-                        print(f"[supervisor] Auto-sent verification code: {code}", flush=True)
-                        await send_safe(chat_id, f"✅ Auto-sent verification code: `{code}`", parse_mode="Markdown")
+                    except Exception as e:
+                        log.warning("[supervisor] Failed to auto-send verify: %s", e)
+                        notice = f"⚠️ Detected code <code>{code}</code> but failed to send manually."
                     else:
-                        await send_safe(chat_id, f"⚠️ Found code `{code}` but process unavailable.", parse_mode="Markdown")
-                except Exception as e:
-                    print(f"[supervisor] Failed to auto-send verify: {e}", flush=True)
-                    await send_safe(chat_id, f"⚠️ Detected code `{code}` but failed to send manually.", parse_mode="Markdown")
-
-            if no_peerid_pattern.search(line):
-                await send_safe(chat_id, "⚠️ No peer IDs found. Please use a valid EVM address.")
-                await stop_active_session("No peer IDs found.")
+                        log.info("[supervisor] Auto-sent verification code: %s", code)
+                        notice = f"✅ Auto-sent verification code: <code>{code}</code>"
+                else:
+                    notice = f"⚠️ Found code <code>{code}</code> but process unavailable."
+                await send_safe_multi(chat_id, digest and html.escape(digest), notice, parse_mode="HTML")
+                digest = None
+
+            if "nopeer" in hits:
+                send_bg(chat_id, join_notices(digest, _NO_PEERID, session_ended_text("No peer IDs found.")))
+                await stop_active_session(silent=True, only_proc=proc)
                 return
 
-            if any(ind in line.lower() for ind in success_indicators):
-                await send_safe(chat_id, "🎉 Account linked successfully! Ending session...")
-                await stop_active_session("✅ Account linked successfully.")
+            if "linked" in hits:
+                send_bg(chat_id, join_notices(digest, _LINKED, session_ended_text("✅ Account linked successfully.")))
+                await stop_active_session(silent=True, only_proc=proc)
                 return
     except Exception as e:
-        print("[supervisor] monitor_gswarm_output exception:", e, flush=True)
+        log.error("[supervisor] monitor_gswarm_output exception: %s", e)
     finally:
-        if active_session.get("proc") is proc:
-            await stop_active_session("GSwarm process exited.")
+        flush_bg()
+        # Unlocked pre-check: when teardown cancels this task it holds the lock
+        # while awaiting it, and has already cleared active_session.proc
+        if active_session.proc is proc:
+            await stop_active_session("GSwarm process exited.", only_proc=proc)
 
 # ----------------- Telegram handlers -----------------
 @dp.message(Command("start"))
 async def cmd_start(message: types.Message):
-    print(f"[handler] /start command received from chat_id={message.chat.id}", flush=True)
+    log.debug("[handler] /start command received from chat_id=%s", message.chat.id)
     try:
-        await message.answer("👋 Welcome! Send your EVM address (0x...) to start monitoring.")
-        print(f"[handler] /start response sent successfully to chat_id={message.chat.id}", flush=True)
+        await message.answer(_WELCOME)
+        log.debug("[handler] /start response sent successfully to chat_id=%s", message.chat.id)
     except Exception as e:
-        print(f"[handler] Error in /start handler: {e}", flush=True)
+        log.error("[handler] Error in /start handler: %s", e)
         raise
 
 @dp.message(Command("stop"))
 async def cmd_stop(message: types.Message):
     chat_id = message.chat.id
-    if active_session["chat_id"] == chat_id:
+    if active_session.chat_id == chat_id:
         await stop_active_session("🛑 Session stopped by user.")
     else:
-        removed = False
-        for i, (cid, _) in enumerate(session_queue):
-            if cid == chat_id:
-                session_queue.pop(i)
-                removed = True
-                break
-        await message.answer("🟡 Removed from queue." if removed else "ℹ️ No active or queued session.")
+        removed = session_queue.pop(chat_id, None) is not None
+        await message.answer(_REMOVED_FROM_QUEUE if removed else _NOTHING_TO_STOP)
+
+async def handle_verify(message: types.Message, text: str):
+    proc = active_session.proc
+    if proc and proc.stdin and not proc.stdin.is_closing() and proc.returncode is None:
+        try:
+            # Extract code from "/verify CODE"
+            parts = text.split()
+            if len(parts) >= 2:
+                code = parts[1]
+                # Send full command format (GSwarm likely expects "/verify CODE")
+                command = b"/verify " + code.encode("utf-8") + b"\n"
+            else:
+                # If no code provided, send the full command as-is
+                command = text.encode("utf-8") + b"\n"
+            
+            log.debug("[supervisor] Sending to GSwarm stdin: %r", command)
+            proc.stdin.write(command)
+            await proc.stdin.drain()
+            log.debug("[supervisor] Command sent and drained")
+            await message.answer(_VERIFY_SENT)
+        except BrokenPipeError:
+            await message.answer(_STDIN_CLOSED)
+            log.warning("[supervisor] BrokenPipeError: stdin closed")
+        except Exception as e:
+            await message.answer(f"⚠️ Failed to send verify command: {e}")
+            log.warning("[supervisor] Error sending verify command: %s", e)
+    else:
+        await message.answer(_NO_PROCESS)
+
+# Slash commands routed through handle_message (/start and /stop have their own filters)
+_CMD_HANDLERS = {"/verify": handle_verify}
 
 @dp.message()
 async def handle_message(message: types.Message):
     chat_id = message.chat.id
     text = (message.text or "").strip()
-    print(f"[handler] Message received: chat_id={chat_id}, text_length={len(text)}", flush=True)
-    if active_session["chat_id"] == chat_id:
-        active_session["last_active"] = datetime.utcnow()
-
-    if text.lower().startswith("/verify"):
-        proc = active_session.get("proc")
-        if proc and proc.stdin and proc.returncode is None:
-            try:
-                # Extract code from "/verify CODE"
-                parts = text.split()
-                if len(parts) >= 2:
-                    code = parts[1]
-                    # Send full command format (GSwarm likely expects "/verify CODE")
-                    command = f"/verify {code}\n"
-                else:
-                    # If no code provided, send the full command as-is
-                    command = text + "\n"
-                
-                print(f"[supervisor] Sending to GSwarm stdin: {repr(command)}", flush=True)
-                proc.stdin.write(command.encode("utf-8"))
-                await proc.stdin.drain()
-                print(f"[supervisor] Command sent and drained", flush=True)
-                await message.answer("✅ Verification command sent to GSwarm. Waiting for response...")
-            except BrokenPipeError:
-                await message.answer("⚠️ GSwarm process stdin is closed. The process may have exited.")
-                print("[supervisor] BrokenPipeError: stdin closed", flush=True)
-            except Exception as e:
-                await message.answer(f"⚠️ Failed to send verify command: {e}")
-                print(f"[supervisor] Error sending verify command: {e}", flush=True)
-        else:
-            await message.answer("ℹ️ No active session or GSwarm process unavailable.")
-        return
-
-    if text.startswith("0x") and len(text) == 42:
+    if _DEBUG:
+        log.debug("[handler] Message received: chat_id=%s, text_length=%d", chat_id, len(text))
+    if active_session.chat_id == chat_id:
+        touch_active_session()
+
+    if text[:1] == "/":
+        # "/verify@MyBot CODE" addresses the same command in group chats
+        cmd = text.split(None, 1)[0].partition("@")[0].lower()
+        handler = _CMD_HANDLERS.get(cmd)
+        if handler:
+            await handler(message, text)
+            return
+
+    if len(text) == 42 and _EVM_RE.fullmatch(text):
         await start_session(chat_id, text)
     else:
-        await message.answer("⚠️ Send a valid EVM address (starting with 0x) to start.")
+        await message.answer(_HELP)
 
 # ----------------- Main -----------------
 async def main():
-    global asyncio_loop
-    asyncio_loop = asyncio.get_running_loop()
-    
-    print("🚀 Starting bot in webhook mode...", flush=True)
+    print(f"🚀 Starting bot in {MODE} mode...", flush=True)
     print(f"[config] Bot token present: {bool(BOT_TOKEN)}", flush=True)
-    print(f"[config] Webhook URL: {WEBHOOK_URL}", flush=True)
-    print(f"[config] Webhook path: {WEBHOOK_PATH}", flush=True)
+    if MODE == "webhook":
+        print(f"[config] Webhook base URL: {PUBLIC_URL}", flush=True)
     
     # Verify bot can connect to Telegram API
     try:
@@ -244,11 +577,22 @@ async def main():
     except Exception as e:
         print(f"[bot] Failed to connect to Telegram API: {e}", flush=True)
         raise
-    
+
+    if MODE == "polling":
+        # Health endpoint only; updates come from getUpdates, which Telegram
+        # refuses while a webhook is still registered. Updates sent during the
+        # restart are kept and delivered by the first poll.
+        print(f"[server] Starting aiohttp server on port {PORT}...", flush=True)
+        await start_http(bot, dp)
+        await bot.delete_webhook(drop_pending_updates=False)
+        print("[supervisor] ✅ Supervisor is running (polling mode)", flush=True)
+        await dp.start_polling(bot)
+        return
+
     # Set webhook
     try:
-        print(f"[webhook] Setting webhook to {WEBHOOK_URL}...", flush=True)
-        await bot.set_webhook(WEBHOOK_URL, drop_pending_updates=True)
+        print(f"[webhook] Setting webhook under {PUBLIC_URL}...", flush=True)
+        await bot.set_webhook(WEBHOOK_URL, secret_token=WEBHOOK_SECRET, drop_pending_updates=True)
         webhook_info = await bot.get_webhook_info()
         if webhook_info.url == WEBHOOK_URL:
             print(f"[webhook] ✅ Webhook set successfully", flush=True)
@@ -258,16 +602,9 @@ async def main():
         print(f"[webhook] ❌ Failed to set webhook: {e}", flush=True)
         raise
     
-    # Initialize webhook handler with bot and dispatcher
-    init_webhook(bot, dp, asyncio_loop)
-    
-    # Start Flask server with webhook handler
-    print(f"[server] Starting Flask server on port {PORT}...", flush=True)
-    keep_alive()
-    
-    # Start session timeout checker
-    asyncio.create_task(session_timeout_checker())
-    print("[supervisor] Session timeout checker started", flush=True)
+    # Start aiohttp server with webhook handler on this loop
+    print(f"[server] Starting aiohttp server on port {PORT}...", flush=True)
+    await start_http(bot, dp, WEBHOOK_PATH, WEBHOOK_SECRET)
     
     # Keep the main coroutine alive (webhook handler will process updates)
     print("[supervisor] ✅ Supervisor is running (webhook mode)", flush=True)